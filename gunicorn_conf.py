@@ -0,0 +1,10 @@
+import multiprocessing
+import os
+
+# each worker runs its own event loop, so scale with the available cores.
+# note that the FreshDesk lookup caches are per worker.
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+)
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = 65
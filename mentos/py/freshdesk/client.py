@@ -1,15 +1,31 @@
+import asyncio
+
 from enum import Enum
-from typing import Any, Dict, List, Optional, Type, TypeVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar, Union
 
 import aiohttp
+import msgspec
+import orjson
 
-from async_lru import alru_cache
+from yarl import URL
 
 import mentos.py.freshdesk.models as fdmodels
 
+from mentos.py.util.cache import async_ttl_cache, single_flight
+
 T = TypeVar("T")
 
 
+@lru_cache(maxsize=None)
+def _decoder(envelope: str, gen_type: Any) -> msgspec.json.Decoder:
+    """FreshDesk wraps every resource in an object keyed by the resource name,
+    e.g. {"ticket": {...}}. Decoders are reusable and cheaper to call than
+    msgspec.json.decode with a type, so keep one around per envelope."""
+    return msgspec.json.Decoder(
+        msgspec.defstruct("Envelope", [(envelope, gen_type)]))
+
+
 class MissingResourceException(Exception):
     """Exception for some missing API resource"""
 
@@ -20,69 +36,183 @@ class ServerError(Exception):
 
 class FreshDeskClient:
     base_url: str = None
+    api_url: URL = None
     api_key: str = None
-    session: aiohttp.ClientSession = None
+    max_concurrency: int = 16
+    # tickets fetched with ?include=conversations embed at most this many of
+    # their oldest conversations
+    included_conversations: int = 10
+    _session: aiohttp.ClientSession = None
 
-    def configure(self, url: str, api_key: str):
-        self.session = aiohttp.ClientSession()
+    def __init__(self):
+        # fetches currently waiting on FreshDesk, keyed by URL
+        self._inflight: Dict[URL, "asyncio.Future[bytes]"] = {}
+
+    def configure(self, url: str, api_key: str, max_concurrency: int = 16):
         self.base_url = url
+        # aiohttp uses URL objects as-is, so building request URLs off of a
+        # pre-parsed base avoids re-parsing the whole URL string every time
+        self.api_url = URL(str(url)) / "api/v2"
         self.api_key = api_key
+        self.max_concurrency = max_concurrency
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the client's HTTP session, creating it on first use so that
+        it's bound to the running event loop. The one pooled session lives as
+        long as the app, keeping connections to FreshDesk alive between Slack
+        commands."""
+        if self._session is None:
+            # every request goes to the same FreshDesk host, so the per-host
+            # limit caps how many requests are in flight at once (the rest
+            # wait for a free connection) to keep bursts of Slack commands
+            # under FreshDesk's rate limits. The host is resolved with aiodns
+            # (from aiohttp[speedups]) instead of a blocking getaddrinfo call
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=self.max_concurrency,
+                resolver=aiohttp.AsyncResolver(),
+                use_dns_cache=True,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True
+            )
+            # aiohttp already asks for gzip/deflate (and br when brotli is
+            # installed) and decompresses transparently, so only the auth and
+            # content type need to be attached to every request
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"content-type": "application/json"},
+                auth=aiohttp.BasicAuth(self.api_key, "X")
+            )
+        return self._session
 
     async def cleanup(self):
-        await self.session.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
-    async def _api_fetch(self, resource: str) -> Dict[str, Any]:
-        api_url = f"{self.base_url}/api/v2/{resource}"
-        headers = {"content-type": "application/json"}
-        async with self.session.get(
-            api_url,
-            headers=headers,
-            auth=aiohttp.BasicAuth(self.api_key, "X")
-        ) as rsp:
+    async def _api_fetch_raw(
+        self,
+        resource: str,
+        query: Optional[Dict[str, str]] = None
+    ) -> bytes:
+        """Fetches a resource's raw response body. Concurrent fetches of the
+        same resource (e.g. several people looking up a ticket that was just
+        announced) share a single request to FreshDesk."""
+        url = self.api_url / resource
+        if query:
+            url = url.with_query(query)
+        return await single_flight(self._inflight, url, self._request, url)
+
+    async def _request(self, url: URL) -> bytes:
+        session = self._get_session()
+        async with session.get(url) as rsp:
             if 400 <= rsp.status < 500:
                 raise MissingResourceException
             elif rsp.status >= 500:
                 raise ServerError
 
-            js = await rsp.json()
-            return js
+            return await rsp.read()
+
+    async def _api_fetch(self, resource: str) -> Dict[str, Any]:
+        return orjson.loads(await self._api_fetch_raw(resource))
 
     async def _api_fetch_list(
         self,
         resource: str,
-        gen_type: Type[T]
+        gen_type: Type[T],
+        envelope: str
     ) -> List[T]:
-        js = await self._api_fetch(resource)
-        inner_list = next(iter(js.values()))
-        return [gen_type(**x) for x in inner_list]
+        # decoding straight into the model types parses and validates the
+        # JSON in one pass without building intermediate dicts
+        raw = await self._api_fetch_raw(resource)
+        js = _decoder(envelope, List[gen_type]).decode(raw)
+        return getattr(js, envelope)
 
     async def _api_fetch_single(
         self,
         resource: str,
-        gen_type: Type[T]
+        gen_type: Type[T],
+        envelope: str,
+        query: Optional[Dict[str, str]] = None
     ) -> T:
-        js = await self._api_fetch(resource)
-        return gen_type(**next(iter(js.values())))
+        raw = await self._api_fetch_raw(resource, query)
+        js = _decoder(envelope, gen_type).decode(raw)
+        return getattr(js, envelope)
+
+    async def _api_fetch_optional(
+        self,
+        resource_id: Optional[int],
+        resource: str,
+        gen_type: Type[T],
+        envelope: str
+    ) -> Optional[T]:
+        """Fetches a resource a ticket refers to, or None if the ticket doesn't
+        refer to one (e.g. an unassigned ticket), it doesn't exist, or its
+        record can't be decoded."""
+        if resource_id is None:
+            return None
+        try:
+            return await self._api_fetch_single(
+                f"{resource}/{resource_id}", gen_type, envelope)
+        except (MissingResourceException, msgspec.DecodeError):
+            return None
 
-    @alru_cache
-    async def get_agent(self, agent_id: int) -> fdmodels.Agent:
-        resource = f"agents/{agent_id}"
-        return await self._api_fetch_single(resource, fdmodels.Agent)
+    @async_ttl_cache(300)
+    async def get_agent(
+        self,
+        agent_id: Optional[int]
+    ) -> Optional[fdmodels.Agent]:
+        return await self._api_fetch_optional(
+            agent_id, "agents", fdmodels.Agent, "agent")
 
-    @alru_cache
-    async def get_requester(self, requester_id: int) -> fdmodels.Requester:
-        resource = f"requesters/{requester_id}"
-        return await self._api_fetch_single(resource, fdmodels.Requester)
+    @async_ttl_cache(60)
+    async def get_requester(
+        self,
+        requester_id: Optional[int]
+    ) -> Optional[fdmodels.Requester]:
+        return await self._api_fetch_optional(
+            requester_id, "requesters", fdmodels.Requester, "requester")
 
-    @alru_cache
-    async def get_agent_group(self, agent_group: int) -> fdmodels.AgentGroup:
-        resource = f"groups/{agent_group}"
-        return await self._api_fetch_single(resource, fdmodels.AgentGroup)
+    @async_ttl_cache(300)
+    async def get_agent_group(
+        self,
+        agent_group: Optional[int]
+    ) -> Optional[fdmodels.AgentGroup]:
+        return await self._api_fetch_optional(
+            agent_group, "groups", fdmodels.AgentGroup, "group")
 
-    @alru_cache
-    async def get_department(self, department_id: int) -> fdmodels.Department:
-        resource = f"departments/{department_id}"
-        return await self._api_fetch_single(resource, fdmodels.Department)
+    @async_ttl_cache(300)
+    async def get_department(
+        self,
+        department_id: Optional[int]
+    ) -> Optional[fdmodels.Department]:
+        return await self._api_fetch_optional(
+            department_id, "departments", fdmodels.Department, "department")
+
+    async def enrich(
+        self,
+        ticket: Union[fdmodels.TicketInfo, fdmodels.TicketSummary]
+    ) -> Tuple[
+        Optional[fdmodels.Agent],
+        Optional[fdmodels.Requester],
+        Optional[fdmodels.AgentGroup]
+    ]:
+        """Fetches the agent, requester and group a ticket refers to. The
+        lookups run concurrently, and any the ticket doesn't have come back as
+        None. A requester that was already included with the ticket is used
+        as-is."""
+        lookups = [
+            self.get_agent(ticket.responder_id),
+            self.get_agent_group(ticket.group_id)
+        ]
+        req = getattr(ticket, "requester", None)
+        if req is None:
+            lookups.append(self.get_requester(ticket.requester_id))
+        agent, group, *fetched = await asyncio.gather(*lookups)
+        if fetched:
+            req = fetched[0]
+        return agent, req, group
 
     async def get_ticket_statuses(self) -> Optional[Enum]:
         resource = "ticket_fields"
@@ -101,15 +231,30 @@ class FreshDeskClient:
         ticket_id: str
     ) -> List[fdmodels.RequestedItems]:
         resource = f"tickets/{ticket_id}/requested_items"
-        return await self._api_fetch_list(resource, fdmodels.RequestedItems)
+        return await self._api_fetch_list(
+            resource, fdmodels.RequestedItems, "requested_items")
 
     async def get_conversations(
         self,
         ticket_id: str
     ) -> List[fdmodels.Conversation]:
         resource = f"tickets/{ticket_id}/conversations"
-        return await self._api_fetch_list(resource, fdmodels.Conversation)
+        return await self._api_fetch_list(
+            resource, fdmodels.Conversation, "conversations")
 
     async def get_ticket(self, ticket_id: str) -> fdmodels.TicketInfo:
         resource = f"tickets/{ticket_id}"
-        return await self._api_fetch_single(resource, fdmodels.TicketInfo)
+        return await self._api_fetch_single(
+            resource, fdmodels.TicketInfo, "ticket")
+
+    async def get_ticket_summary(
+        self,
+        ticket_id: str,
+        include: Optional[List[str]] = None
+    ) -> fdmodels.TicketSummary:
+        """Fetches a ticket's summary, optionally embedding related records
+        (e.g. "conversations" or "requester") in the same response."""
+        resource = f"tickets/{ticket_id}"
+        query = {"include": ",".join(include)} if include else None
+        return await self._api_fetch_single(
+            resource, fdmodels.TicketSummary, "ticket", query)
@@ -1,8 +1,8 @@
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel
+import msgspec
 
 
 TicketStatus = Enum(
@@ -21,7 +21,7 @@ TicketType = Enum("TicketType", [
      ("Case", "Case")])
 
 
-class Requester(BaseModel):
+class Requester(msgspec.Struct, kw_only=True):
     """This is the 'requester' block that is returned when tickets are
     requested with the '?include=requester' param"""
     id: int
@@ -30,22 +30,22 @@ class Requester(BaseModel):
     primary_email: Optional[str] = ""
 
 
-class Conversation(BaseModel):
+class Conversation(msgspec.Struct, kw_only=True):
     created_at: datetime
     updated_at: datetime
     body: str
     body_text: str
     private: bool = False
     user_id: int
-    support_email: Optional[str]
+    support_email: Optional[str] = None
     ticket_id: int
 
 
-class RequestedItems(BaseModel):
-    custom_fields: Dict[str, Optional[str]]
+class RequestedItems(msgspec.Struct, kw_only=True):
+    custom_fields: Dict[str, Any]
 
 
-class TicketInfo(BaseModel):
+class TicketInfo(msgspec.Struct, kw_only=True):
     """
     Model for the FreshDesk API's ticket info. Doesn't fully capture everything
     in the response because there are some additional fields that don't really
@@ -57,17 +57,17 @@ class TicketInfo(BaseModel):
     reply_cc_emails: List[str]
     fr_escalated: bool
     spam: bool
-    email_config_id: Optional[int]
-    group_id: Optional[int]
+    email_config_id: Optional[int] = None
+    group_id: Optional[int] = None
     priority: int
     requester_id: int
-    responder_id: Optional[int]
+    responder_id: Optional[int] = None
     source: int
     status: int
     subject: str
-    to_emails: Optional[List[str]]
+    to_emails: Optional[List[str]] = None
     sla_policy_id: int
-    department_id: Optional[int]
+    department_id: Optional[int] = None
     id: int
     type: TicketType
     due_by: datetime
@@ -79,19 +79,37 @@ class TicketInfo(BaseModel):
     updated_at: datetime
     urgency: int
     impact: int
-    category: Optional[str]
-    sub_category: Optional[str]
-    item_category: Optional[str]
+    category: Optional[str] = None
+    sub_category: Optional[str] = None
+    item_category: Optional[str] = None
     deleted: bool
 
 
-class AgentGroup(BaseModel):
+class TicketSummary(msgspec.Struct, kw_only=True):
+    """The subset of TicketInfo that's needed to render a ticket in Slack.
+    Decoding into this skips validating the fields nothing displays."""
+    id: int
+    subject: str
+    type: TicketType
+    status: int
+    requester_id: int
+    responder_id: Optional[int] = None
+    group_id: Optional[int] = None
+    description_text: str
+    created_at: datetime
+    updated_at: datetime
+    # only present when requested with the '?include=' param
+    conversations: Optional[List[Conversation]] = None
+    requester: Optional[Requester] = None
+
+
+class AgentGroup(msgspec.Struct, kw_only=True):
     id: int
     name: str
-    description: Optional[str]
+    description: Optional[str] = None
 
 
-class Agent(BaseModel):
+class Agent(msgspec.Struct, kw_only=True):
     id: int
     active: bool
     email: str
@@ -99,7 +117,7 @@ class Agent(BaseModel):
     last_name: str
 
 
-class Department(BaseModel):
+class Department(msgspec.Struct, kw_only=True):
     id: int
     name: str
     description: str
@@ -1,11 +1,13 @@
 from functools import lru_cache
-from typing import List
+from typing import FrozenSet, Tuple
 
-import argparse
 import logging
-import urllib.parse
+
+import msgspec
+import orjson
 
 from fastapi import Depends, FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseSettings, HttpUrl
 
 import mentos.py.slack.util as SlackUtils
@@ -23,11 +25,15 @@ class Settings(BaseSettings):
     freshdesk_api_key: str
     slack_signing_secret: str
     limit_users: bool = True
-    approved_users: List[str]
+    # a set so that checking who may use the bot is a hash lookup
+    approved_users: FrozenSet[str]
 
     # whether to fetch custom ticket statuses from freshdesk
     init_custom_statuses: bool = False
 
+    # most requests to have in flight to freshdesk at once, per worker
+    freshdesk_max_concurrency: int = 16
+
     class Config:
         env_file = ".env"
 
@@ -37,26 +43,68 @@ def get_settings() -> Settings:
     return Settings()
 
 
-def get_ticket_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(description="Parse ticket request")
-    parser.add_argument("-v", dest="verbose", action="store_true")
-    parser.add_argument("-p", dest="private", action="store_true")
-    parser.add_argument("ticket")
-    return parser
+@lru_cache
+def get_signing_secret() -> bytes:
+    return get_settings().slack_signing_secret.encode("utf-8")
+
+
+def parse_ticket_cmd(text: str) -> Tuple[str, bool, bool]:
+    """Parses the text of a `/COMMAND [-v] [-p] TICKET` call into the ticket
+    and its verbose and private flags. Flags can be combined, e.g. -vp.
+
+    Raises ValueError if the text isn't a valid command."""
+    ticket = None
+    verbose = False
+    private = False
+    for tok in text.split():
+        if tok.startswith("-") and len(tok) > 1:
+            flags = tok[1:]
+            if flags.strip("vp"):
+                raise ValueError(f"Unknown option {tok}")
+            verbose |= "v" in flags
+            private |= "p" in flags
+        elif ticket is None:
+            ticket = tok
+        else:
+            raise ValueError(f"Unexpected argument {tok}")
+
+    if ticket is None:
+        raise ValueError("Missing ticket")
+    return ticket, verbose, private
+
+
+# replies to requests that fail verification never change, so they're
+# serialized once up front
+UNVERIFIED_REPLIES = {
+    VerificationStatus.BAD_SIGNATURE: orjson.dumps(
+        {"text": "Slack API call could not be verified."}
+    ),
+    VerificationStatus.OUTDATED_REQUEST: orjson.dumps(
+        {"text": "Old Slack call received. Possible replay attack seen!"}
+    ),
+}
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 freshdesk = FreshDeskClient()
 ticket_statuses = TicketStatus
+# created once the ticket statuses are known at startup
+block_creator: FullBlockCreator = None
 
 logger = logging.getLogger("uvicorn")
-logger.setLevel("DEBUG")
 
 
 @app.on_event("startup")
 async def startup():
+    # validate settings and encode the signing secret before the first
+    # request rather than during it
     settings = get_settings()
-    freshdesk.configure(settings.freshdesk_api_url, settings.freshdesk_api_key)
+    get_signing_secret()
+    freshdesk.configure(
+        settings.freshdesk_api_url,
+        settings.freshdesk_api_key,
+        settings.freshdesk_max_concurrency
+    )
 
     if settings.init_custom_statuses:
         logger.info("[startup] INIT_CUSTOM_STATUSES enabled, populating custom ticket statuses")
@@ -66,6 +114,15 @@ async def startup():
             ticket_statuses = statuses
             logger.info("[startup] Custom ticket statuses initialized")
 
+    # shared between requests so that concurrent identical commands can share
+    # the message being generated
+    global block_creator
+    block_creator = FullBlockCreator(
+        freshdesk,
+        settings.freshdesk_access_url,
+        ticket_statuses
+    )
+
 
 @app.on_event("shutdown")
 async def shutdown_app():
@@ -90,43 +147,54 @@ async def ticket_info(
     * -p - show the information privately to requester, rather than publicly
     * TICKET - a number/identifier for the FreshDesk ticket"""
 
-    body = (await request.body()).decode("utf-8")
-    logger.info(request.headers)
-    logger.info(body)
     req_ts = int(request.headers["x-slack-request-timestamp"])
-    logger.info(f"x-slack-request-timestamp={req_ts}")
     req_sig = request.headers["x-slack-signature"]
-    logger.info(f"x-slack-signature={req_sig}")
-    secret = settings.slack_signing_secret
-
-    sig_ver = SlackUtils.verify_signature(secret, body, req_sig, req_ts)
-    if sig_ver in (VerificationStatus.VERIFIED,):
-        qsd = dict(urllib.parse.parse_qsl(body))
-        payload = SlackPayload.parse_obj(qsd)
-
-        if (settings.limit_users
-                and payload.user_name not in settings.approved_users):
-            return {
-                "text": f"Sorry, user {payload.user_name} isn't authorized."
-            }
-
-        parser = get_ticket_parser()
-        command_args = parser.parse_args(payload.text.split())
-        fbc = FullBlockCreator(
-            freshdesk,
-            settings.freshdesk_access_url,
-            ticket_statuses
-        )
-        blocks = await fbc.gen_ticket_block(
-            command_args.ticket,
-            command_args.verbose,
-            command_args.private
-        )
-        return blocks
+    secret = get_signing_secret()
+
+    # oversized requests aren't from Slack, so don't read or hash them. Slack
+    # always sends a Content-Length, which the server won't read past, so
+    # requests without one (e.g. chunked uploads) are turned away as well
+    content_length = request.headers.get("content-length")
+    if (
+        content_length is None
+        or int(content_length) > SlackUtils.MAX_PAYLOAD_SIZE
+    ):
+        sig_ver = VerificationStatus.BAD_SIGNATURE
     else:
-        if sig_ver == VerificationStatus.BAD_SIGNATURE:
-            return {"text": "Slack API call could not be verified."}
-        else:
-            return {
-                "text": "Old Slack call received. Possible replay attack seen!"
-            }
+        # kept as bytes: the signature is computed over the raw body and the
+        # form parser reads the same cached bytes
+        body = await request.body()
+        sig_ver = SlackUtils.verify_signature(secret, body, req_sig, req_ts)
+    if sig_ver != VerificationStatus.VERIFIED:
+        return Response(
+            content=UNVERIFIED_REPLIES[sig_ver],
+            media_type="application/json"
+        )
+
+    # the body is already cached on the request, so the form parser reads
+    # it from there instead of re-receiving it
+    form = await request.form()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("headers=%s", request.headers)
+        logger.debug("body=%s", body)
+        logger.debug("payload=%r", msgspec.convert(dict(form), SlackPayload))
+
+    # only a couple of the payload's fields are needed to serve the
+    # command, so skip building the full SlackPayload for them
+    user_name = form["user_name"]
+    if settings.limit_users and user_name not in settings.approved_users:
+        return ORJSONResponse({
+            "text": f"Sorry, user {user_name} isn't authorized."
+        })
+
+    try:
+        ticket, verbose, private = parse_ticket_cmd(form["text"])
+    except ValueError as e:
+        return ORJSONResponse({
+            "text": f"{e}. Usage: {form['command']} [-v] [-p] TICKET"
+        })
+
+    blocks = await block_creator.gen_ticket_block(ticket, verbose, private)
+    # returning a response directly skips FastAPI's jsonable_encoder walk of
+    # the already JSON-ready block dicts
+    return ORJSONResponse(blocks)
@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+import msgspec
 
 
-class SlackPayload(BaseModel):
+class SlackPayload(msgspec.Struct):
     """This payload is documented in Slack's command API.
 
     It ignores some fields that don't particularly matter like whether or not
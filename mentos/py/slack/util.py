@@ -1,10 +1,18 @@
 import hashlib
 import hmac
+import re
 import time
 
 from enum import Enum
 
 
+# slash command payloads are a handful of short form fields, so anything
+# bigger than this can't be a real Slack request
+MAX_PAYLOAD_SIZE = 64 * 1024
+
+SIGNATURE_RE = re.compile(r"v0=[0-9a-f]{64}")
+
+
 class VerificationStatus(Enum):
     VERIFIED = 1
     BAD_SIGNATURE = 2
@@ -12,16 +20,16 @@ class VerificationStatus(Enum):
 
 
 def verify_signature(
-    secret: str,
-    body: str,
+    secret: bytes,
+    body: bytes,
     req_sig: str,
     req_ts: int
 ) -> VerificationStatus:
     """Perform request signature verification.
 
-    Requires the signing secret from your Slack application.
-    The other parameters are the raw request body (from Slack), request
-    signature, and the request timestamp.
+    Requires the signing secret from your Slack application, already encoded
+    to bytes. The other parameters are the raw request body (from Slack),
+    request signature, and the request timestamp.
 
     See https://api.slack.com/authentication/verifying-requests-from-slack"""
     if abs(int(time.time()) - req_ts) > 300:
@@ -29,13 +37,18 @@ def verify_signature(
         # a replay
         return VerificationStatus.OUTDATED_REQUEST
 
-    bs = f"v0:{req_ts}:{body}"
-    hsh = hmac.new(
-            bytes(secret, "utf-8"),
-            msg=bytes(bs, "utf-8"),
-            digestmod=hashlib.sha256).hexdigest()
+    # signatures look like "v0=<hex digest>", so compare the raw digest bytes
+    # rather than hex-encoding our own digest
+    if not SIGNATURE_RE.fullmatch(req_sig):
+        return VerificationStatus.BAD_SIGNATURE
+    expected = bytes.fromhex(req_sig[3:])
+
+    # feed the signed pieces in separately instead of formatting the whole
+    # body into another string first
+    mac = hmac.new(secret, digestmod=hashlib.sha256)
+    mac.update(f"v0:{req_ts}:".encode("ascii"))
+    mac.update(body)
 
-    signature = f"v0={hsh}"
-    if hmac.compare_digest(signature, req_sig):
+    if hmac.compare_digest(mac.digest(), expected):
         return VerificationStatus.VERIFIED
     return VerificationStatus.BAD_SIGNATURE
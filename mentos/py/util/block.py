@@ -3,8 +3,12 @@ import re
 
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
 from operator import attrgetter
-from typing import Any, ClassVar, Dict, List
+from typing import Any, ClassVar, Dict, List, Tuple
+
+import aiohttp
+import msgspec
 
 from mentos.py.freshdesk.client import (
     FreshDeskClient, MissingResourceException, ServerError
@@ -13,6 +17,18 @@ from mentos.py.freshdesk.client import (
 from mentos.py.freshdesk.models import TicketStatus, TicketType
 import mentos.py.freshdesk.models as fdmodels
 
+from mentos.py.util.cache import single_flight
+
+
+# failures to get any answer out of FreshDesk, as opposed to it answering that
+# something doesn't exist
+_SERVER_ERRORS = (ServerError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def _field(text: str) -> Dict[str, str]:
+    """A markdown text field for a section block."""
+    return {"type": "mrkdwn", "text": text}
+
 
 class FullBlockCreator:
     ticket_map = {
@@ -21,6 +37,20 @@ class FullBlockCreator:
         TicketType.Request: "REQ",
         TicketType["Service Request"]: "SR",
     }
+    description_titles = {
+        TicketType.Case: "*Case Description*",
+        TicketType.Incident: "*Description*",
+        TicketType.Request: "*Request - Requested Items*",
+        TicketType["Service Request"]: "*Service Request - Requested Items*",
+    }
+    # requests are described by the items requested rather than their text
+    item_types = {TicketType.Request, TicketType["Service Request"]}
+    # static blocks are shared between messages rather than rebuilt each time;
+    # nothing mutates them once they've been returned
+    divider = {"type": "divider"}
+    # runs of 2+ whitespace characters that reply bodies use as line breaks
+    whitespace_run: ClassVar[re.Pattern] = re.compile(r"\s{2,}")
+
     def __init__(
         self,
         freshdesk: FreshDeskClient,
@@ -30,6 +60,10 @@ class FullBlockCreator:
         self.client = freshdesk
         self.access_url = access_url
         self.statuses = ticket_statuses
+        # messages currently being generated, keyed by the command's options
+        self._inflight: Dict[
+            Tuple[str, bool, bool], "asyncio.Future[Dict[str, Any]]"
+        ] = {}
 
     def format_body(self, text: str) -> str:
         """Reply bodies get some rather ugly formatting so this tries to do some
@@ -37,21 +71,25 @@ class FullBlockCreator:
         also sent via API calls like conversations or tickets."""
         # basic rules - if something has more than 3 spaces in a row, assume
         # it's just a linebreak.
-        lines = re.split(r"\s{2,}", text)
+        lines = FullBlockCreator.whitespace_run.split(text)
         return "\n\n".join(lines)
 
     def format_sr_info(self, req_info: List[fdmodels.RequestedItems]):
-        text = []
-        print(type(req_info))
-        for ri in req_info:
-            for k, v in ri.custom_fields.items():
-                key = k.replace("_", " ").title()
-                text.append(f"*{key}*: {v}")
-        return "\n".join(text)
-
-    def create_date(self, date: datetime, title: str) -> str:
+        return "\n".join(
+            f"*{k.replace('_', ' ').title()}*: {v}"
+            for ri in req_info
+            for k, v in ri.custom_fields.items()
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def create_date(date: datetime, title: str) -> str:
+        """Formats a titled Slack date. Cached since the same ticket's dates
+        get formatted again every time someone looks it up."""
         ts = int(date.timestamp())
-        fallback = date.strftime("%c")
+        # Slack renders the timestamp itself; the fallback is only shown by
+        # clients that can't, so skip the locale-aware strftime("%c")
+        fallback = date.isoformat(sep=" ", timespec="seconds")
         return f"*{title}:*\n<!date^{ts}^{{date}} {{time}}|{fallback}>"
 
     async def gen_ticket_block(
@@ -60,26 +98,89 @@ class FullBlockCreator:
         verbose: bool = False,
         ephemeral: bool = False
     ) -> Dict[str, Any]:
-        divider = {"type": "divider"}
+        """Generates the Slack message for a ticket. Identical commands that
+        arrive while one is being generated (e.g. several people looking up a
+        ticket that was just announced) share the same message, which is safe
+        since nothing in it depends on who asked."""
+        return await single_flight(
+            self._inflight,
+            (ticket_id, verbose, ephemeral),
+            self._gen_ticket_block,
+            ticket_id, verbose, ephemeral
+        )
 
+    async def _gen_ticket_block(
+        self,
+        ticket_id: str,
+        verbose: bool,
+        ephemeral: bool
+    ) -> Dict[str, Any]:
         try:
-            ticket = await self.client.get_ticket(ticket_id)
+            # the conversations and requester come back with the ticket
+            # itself rather than taking requests of their own
+            ticket = await self.client.get_ticket_summary(
+                ticket_id, include=["conversations", "requester"])
         except MissingResourceException:
             return {"text": f"Ticket {ticket_id} not found"}
-        except ServerError:
+        except msgspec.DecodeError:
+            # the ticket, or one of the records included with it, is malformed
+            return {"text": f"Ticket {ticket_id} could not be loaded"}
+        except _SERVER_ERRORS:
             return {"text": "FreshDesk server encountered issues. Try again later."}
 
+        convos = ticket.conversations
+        req = ticket.requester
+        # only the oldest conversations are included, so longer tickets need
+        # the full list to find their latest reply
+        truncated = (
+            convos is None
+            or len(convos) >= self.client.included_conversations
+        )
+
         # tickets provide a bunch of identifiers that need to be reified
-        # into additional objects
-        agent, req, group, convos, req_items = await asyncio.gather(
-            self.client.get_agent(ticket.responder_id),
-            self.client.get_requester(ticket.requester_id),
-            self.client.get_agent_group(ticket.group_id),
-            self.client.get_conversations(ticket_id),
-            self.client.get_requested_items(ticket_id),
-            return_exceptions=True
+        # into additional objects, but only verbose messages show them all
+        agent = group = None
+        try:
+            if verbose:
+                # lookups a ticket doesn't need resolve to what's already known
+                if truncated:
+                    convos_lookup = self.client.get_conversations(ticket_id)
+                else:
+                    convos_lookup = asyncio.sleep(0, result=convos)
+                if ticket.type in FullBlockCreator.item_types:
+                    items_lookup = self.client.get_requested_items(ticket_id)
+                else:
+                    items_lookup = asyncio.sleep(0, result=[])
+                (agent, req, group), convos, req_items = await asyncio.gather(
+                    self.client.enrich(ticket),
+                    convos_lookup,
+                    items_lookup
+                )
+            elif truncated:
+                convos = await self.client.get_conversations(ticket_id)
+        except (MissingResourceException, msgspec.DecodeError):
+            # the ticket itself exists, but its replies or requested items
+            # couldn't be read
+            return {"text": f"Ticket {ticket_id}'s details could not be loaded"}
+        except _SERVER_ERRORS:
+            return {"text": "FreshDesk server encountered issues. Try again later."}
+
+        # the last update is the most recently created public conversation
+        last_public = max(
+            (r for r in convos if not r.private),
+            key=attrgetter("created_at"),
+            default=None
         )
 
+        if last_public and not verbose:
+            # the only person a short message names is the latest replier,
+            # and the requester is already on hand
+            if last_public.user_id != ticket.requester_id:
+                try:
+                    agent = await self.client.get_agent(ticket.responder_id)
+                except _SERVER_ERRORS:
+                    pass
+
         header = {
             "type": "header",
             "text": {
@@ -89,8 +190,6 @@ class FullBlockCreator:
             }
         }
 
-        submitted = self.create_date(ticket.created_at, "Date Submitted")
-        updated = self.create_date(ticket.updated_at, "Last Update")
         try:
             status = self.statuses(ticket.status).name
         except ValueError:
@@ -99,90 +198,57 @@ class FullBlockCreator:
 
         key_type = FullBlockCreator.ticket_map[ticket.type]
         ident = f"{key_type}-{ticket_id}"
-        if ticket.type in [TicketType.Incident]:
-            description = {
-                "mrkdwn_in": ["pretext", "text"],
-                "pretext": "*Description*",
-                "color": "#ff9933",
-                "text": self.format_body(ticket.description_text)
-            }
-        elif ticket.type in [TicketType.Case]:
-            description = {
-                "mrkdwn_in": ["pretext", "text"],
-                "pretext": "*Case Description*",
-                "color": "#ff9933",
-                "text": self.format_body(ticket.description_text)
-            }
-        else:
-            pretext_name = "Request" if ticket.type == TicketType.Request else "Service Request"
+        if verbose:
+            if ticket.type in FullBlockCreator.item_types:
+                description_text = self.format_sr_info(req_items)
+            else:
+                description_text = self.format_body(ticket.description_text)
             description = {
                 "mrkdwn_in": ["pretext", "text"],
-                "pretext": f"*{pretext_name} - Requested Items*",
+                "pretext": FullBlockCreator.description_titles[ticket.type],
                 "color": "#ff9933",
-                "text": self.format_sr_info(req_items)
+                "text": description_text
             }
 
-        info_sections = {
-            "type": "section",
-            "fields": [
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Ticket:*\n<{ticket_url}|{ident}>"
-                }
-            ]
-        }
+        ticket_field = _field(f"*Ticket:*\n<{ticket_url}|{ident}>")
+
+        if req is not None:
+            requester = f"*Client:*\n{req.first_name} {req.last_name}"
+        else:
+            requester = f"*Client*: Unknown"
 
         # sometimes stuff doesn't have groups or agents, either
         # because they're unassigned or because groups aren't
         # used
-        agentless = False
-        if isinstance(agent, MissingResourceException):
-            agentless = True
-            agent_text = "No Agent Assigned"
-        else:
-            agent_text = f"{agent.first_name} {agent.last_name}"
+        agentless = agent is None
 
-        if isinstance(group, MissingResourceException):
-            group_text = "No Assigned Group"
-        else:
-            group_text = group.name
+        # the rest of the fields are only shown in verbose messages
+        if verbose:
+            submitted = self.create_date(ticket.created_at, "Date Submitted")
+            updated = self.create_date(ticket.updated_at, "Last Update")
 
-        if req:
-            requester = f"*Client:*\n{req.first_name} {req.last_name}"
-        else:
-            requester = f"*Client*: Unknown"
+            if agentless:
+                agent_text = "No Agent Assigned"
+            else:
+                agent_text = f"{agent.first_name} {agent.last_name}"
 
-        if verbose:
-            info_sections["fields"].extend([
-                {
-                    "type": "mrkdwn",
-                    "text": submitted
-                },
-                {
-                    "type": "mrkdwn",
-                    "text": requester
-                },
-                {
-                    "type": "mrkdwn",
-                    "text": updated
-                },
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Assigned Tech Group:*\n{group_text}"
-                },
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Current Status:*\n{status}"
-                },
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Assigned Tech:*\n{agent_text}"
-                }
-            ])
-
-        # for last update, sort the conversations by created (probably?)
-        replies = sorted(convos, key=attrgetter("created_at"), reverse=True)
-        last_public = next((r for r in replies if not r.private), None)
+            if group is None:
+                group_text = "No Assigned Group"
+            else:
+                group_text = group.name
+
+            fields = [
+                ticket_field,
+                _field(submitted),
+                _field(requester),
+                _field(updated),
+                _field(f"*Assigned Tech Group:*\n{group_text}"),
+                _field(f"*Current Status:*\n{status}"),
+                _field(f"*Assigned Tech:*\n{agent_text}")
+            ]
+        else:
+            fields = [ticket_field]
+        info_sections = {"type": "section", "fields": fields}
 
         if last_public:
             if last_public.user_id == ticket.requester_id:
@@ -209,6 +275,7 @@ class FullBlockCreator:
                 "text": "*No replies to show*"
             }
 
+        divider = FullBlockCreator.divider
         blocks = [header, divider, info_sections, divider]
         if verbose:
             attachments = [description, reply_attachment]
@@ -0,0 +1,65 @@
+import asyncio
+import functools
+import time
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+async def single_flight(
+    inflight: Dict[Hashable, "asyncio.Future[T]"],
+    key: Hashable,
+    fn: Callable[..., Awaitable[T]],
+    *args: Any
+) -> T:
+    """Awaits `fn(*args)`, unless a call for `key` is already in flight in
+    `inflight`, in which case that call's result is shared instead. The entry
+    is removed once the call finishes, so later calls start afresh."""
+    fut = inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(fn(*args))
+        inflight[key] = fut
+        fut.add_done_callback(lambda _: inflight.pop(key, None))
+    # shielded so one caller going away doesn't cancel it for the others
+    return await asyncio.shield(fut)
+
+
+def async_ttl_cache(ttl_seconds: float, maxsize: int = 1024) -> Callable:
+    """Caches the results of a coroutine function for `ttl_seconds`, keeping
+    at most `maxsize` of the most recently used entries.
+
+    Futures are cached rather than results, so concurrent calls with the same
+    arguments share one underlying call. Failed calls are dropped from the
+    cache so that the next call retries."""
+    def decorator(fn: Callable) -> Callable:
+        cache: "OrderedDict[Hashable, Tuple[float, asyncio.Future]]" = \
+            OrderedDict()
+
+        def evict_failed(key: Hashable, fut: asyncio.Future):
+            failed = fut.cancelled() or fut.exception() is not None
+            entry = cache.get(key)
+            if failed and entry is not None and entry[1] is fut:
+                del cache[key]
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs) -> Any:
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            entry = cache.get(key)
+            if entry is not None and entry[0] > now:
+                cache.move_to_end(key)
+                fut = entry[1]
+            else:
+                fut = asyncio.ensure_future(fn(*args, **kwargs))
+                fut.add_done_callback(functools.partial(evict_failed, key))
+                cache[key] = (now + ttl_seconds, fut)
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return await asyncio.shield(fut)
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
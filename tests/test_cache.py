@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from mentos.py.util.cache import async_ttl_cache, single_flight
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    @async_ttl_cache(60)
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key * 2
+
+    async def run():
+        return await asyncio.gather(*(fetch(3) for _ in range(5)))
+
+    assert asyncio.run(run()) == [6] * 5
+    assert calls == [3]
+
+
+def test_entries_expire_after_ttl():
+    calls = []
+
+    @async_ttl_cache(0.05)
+    async def fetch(key):
+        calls.append(key)
+        return key
+
+    async def run():
+        await fetch(1)
+        await fetch(1)
+        await asyncio.sleep(0.1)
+        await fetch(1)
+
+    asyncio.run(run())
+    assert calls == [1, 1]
+
+
+def test_least_recently_used_entry_is_evicted():
+    calls = []
+
+    @async_ttl_cache(60, maxsize=2)
+    async def fetch(key):
+        calls.append(key)
+        return key
+
+    async def run():
+        await fetch(1)
+        await fetch(2)
+        await fetch(1)  # 2 is now the least recently used
+        await fetch(3)
+        await fetch(1)
+        await fetch(2)
+
+    asyncio.run(run())
+    assert calls == [1, 2, 3, 2]
+
+
+def test_failed_call_is_retried():
+    calls = []
+
+    @async_ttl_cache(60)
+    async def fetch(key):
+        calls.append(key)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return key
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await fetch(1)
+        return await fetch(1)
+
+    assert asyncio.run(run()) == 1
+    assert calls == [1, 1]
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    calls = []
+
+    @async_ttl_cache(60)
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return key
+
+    async def run():
+        first = asyncio.ensure_future(fetch(1))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(fetch(1))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, await fetch(1)
+
+    assert asyncio.run(run()) == (1, 1)
+    assert calls == [1]
+
+
+def test_single_flight_shares_in_flight_calls_only():
+    calls = []
+    inflight = {}
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def run():
+        shared = await asyncio.gather(
+            *(single_flight(inflight, "k", fetch, 1) for _ in range(3)))
+        assert inflight == {}
+        return shared, await single_flight(inflight, "k", fetch, 1)
+
+    assert asyncio.run(run()) == ([1, 1, 1], 1)
+    assert calls == [1, 1]